@@ -0,0 +1,131 @@
+"""Compare bytes on the wire and per-request CPU of full vs lean payloads.
+
+Bodies below COMPRESSION_MIN_SIZE are reported uncompressed, as the
+compression middleware sends them; larger ones are compressed with the
+middleware's settings.
+
+Usage: python benchmark_responses.py
+"""
+import gzip
+import json
+import os
+import tempfile
+import timeit
+
+# main.py creates the Groq client and the chat database at import time
+os.environ.setdefault("GROQ_API_KEY", "benchmark")
+os.environ.setdefault("CHAT_DB_PATH", os.path.join(tempfile.mkdtemp(), "benchmark.db"))
+
+from main import format_weather_data, COMPRESSION_MIN_SIZE  # noqa: E402
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+ITERATIONS = 5000
+
+# Shape of a WeatherAPI.com current.json response with aqi=yes
+SAMPLE_WEATHER = {
+    "location": {
+        "name": "Tokyo", "region": "Tokyo", "country": "Japan", "lat": 35.69, "lon": 139.69,
+        "tz_id": "Asia/Tokyo", "localtime_epoch": 1760860800, "localtime": "2025-10-19 17:00"
+    },
+    "current": {
+        "last_updated_epoch": 1760860500, "last_updated": "2025-10-19 16:55",
+        "temp_c": 21.0, "temp_f": 69.8, "is_day": 1,
+        "condition": {"text": "Partly cloudy", "icon": "//cdn.weatherapi.com/weather/64x64/day/116.png", "code": 1003},
+        "wind_mph": 8.1, "wind_kph": 13.0, "wind_degree": 190, "wind_dir": "S",
+        "pressure_mb": 1016.0, "pressure_in": 30.0, "precip_mm": 0.0, "precip_in": 0.0,
+        "humidity": 64, "cloud": 50, "feelslike_c": 21.0, "feelslike_f": 69.8,
+        "windchill_c": 19.8, "windchill_f": 67.6, "heatindex_c": 19.8, "heatindex_f": 67.6,
+        "dewpoint_c": 12.9, "dewpoint_f": 55.2, "vis_km": 10.0, "vis_miles": 6.0,
+        "uv": 1.2, "gust_mph": 10.2, "gust_kph": 16.4,
+        "air_quality": {
+            "co": 293.7, "no2": 26.3, "o3": 71.0, "so2": 7.4, "pm2_5": 9.8, "pm10": 12.1,
+            "us-epa-index": 1, "gb-defra-index": 1
+        }
+    }
+}
+
+
+def sample_history(turns):
+    history = []
+    for i in range(turns):
+        history.append({"id": 2 * i + 1, "role": "user", "content": "What should I wear today if I go for a walk in the park?"})
+        history.append({"id": 2 * i + 2, "role": "assistant", "content": "It's 21°C and partly cloudy, so a light jacket over a t-shirt " * 4})
+    return history
+
+
+def build_payloads(turns=20):
+    history = sample_history(turns)
+    suggestion = history[-1]["content"]
+    return {
+        "/api/weather": (
+            format_weather_data(SAMPLE_WEATHER),
+            format_weather_data(SAMPLE_WEATHER, include_raw=False)
+        ),
+        "/api/suggestions": (
+            {"suggestion": suggestion, "chat_history": history,
+             "weather": format_weather_data(SAMPLE_WEATHER), "weather_updated": True},
+            {"suggestion": suggestion, "new_messages": history[-2:],
+             "weather": format_weather_data(SAMPLE_WEATHER, include_raw=False), "weather_updated": True}
+        ),
+    }
+
+
+def encode_json(payload):
+    # Matches starlette's JSONResponse.render
+    return json.dumps(payload, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+
+
+def gzip_compress(body):
+    # GZipMiddleware default compresslevel
+    return gzip.compress(body, compresslevel=9)
+
+
+def brotli_compress(body):
+    # BrotliMiddleware defaults
+    return brotli.compress(body, quality=4, mode=brotli.MODE_TEXT, lgwin=22, lgblock=0)
+
+
+def per_call_us(func, arg):
+    return timeit.timeit(lambda: func(arg), number=ITERATIONS) / ITERATIONS * 1e6
+
+
+def report(name, payload):
+    body = encode_json(payload)
+    encoders = [("json", encode_json)]
+    if orjson:
+        encoders.append(("orjson", orjson.dumps))
+    timings = [f"{label} {per_call_us(func, payload):.1f} us" for label, func in encoders]
+
+    if len(body) < COMPRESSION_MIN_SIZE:
+        print(f"  {name:<5} identity {len(body)} B (below threshold) | {', '.join(timings)}")
+        return
+
+    compressors = [("gzip", gzip_compress)]
+    if brotli:
+        compressors.append(("br", brotli_compress))
+    sizes = [f"identity {len(body)} B"]
+    for label, func in compressors:
+        sizes.append(f"{label} {len(func(body))} B")
+        timings.append(f"{label} {per_call_us(func, body):.1f} us")
+    print(f"  {name:<5} {', '.join(sizes)} | {', '.join(timings)}")
+
+
+def main():
+    print(f"Compression threshold: {COMPRESSION_MIN_SIZE} B, {ITERATIONS} iterations per encoder/compressor")
+    for endpoint, (full, lean) in build_payloads().items():
+        print(endpoint)
+        report("full", full)
+        report("lean", lean)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,37 @@
-from fastapi import FastAPI, HTTPException, UploadFile, File, Form
+from fastapi import FastAPI, HTTPException, UploadFile, File, Form, Header, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 from fastapi.responses import JSONResponse
 from pydantic import BaseModel
 from typing import Optional, List
 import requests
 from groq import Groq
 import os
+import json
+import sqlite3
+import threading
+import time
 from typing import Optional
 from dotenv import load_dotenv
 
 load_dotenv()
 
-app = FastAPI(title="Weather Activity Advisor API")
+# Use orjson for response serialization when it's installed
+try:
+    import orjson  # noqa: F401
+    from fastapi.responses import ORJSONResponse as DefaultResponse
+except ImportError:
+    DefaultResponse = JSONResponse
+
+app = FastAPI(title="Weather Activity Advisor API", default_response_class=DefaultResponse)
+
+# Compress responses above a size threshold (brotli when available, gzip otherwise)
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "500"))
+try:
+    from brotli_asgi import BrotliMiddleware
+    app.add_middleware(BrotliMiddleware, minimum_size=COMPRESSION_MIN_SIZE, gzip_fallback=True)
+except ImportError:
+    app.add_middleware(GZipMiddleware, minimum_size=COMPRESSION_MIN_SIZE)
 
 # CORS middleware
 # Allow both development and production origins
@@ -33,8 +53,195 @@ DEEPGRAM_API_KEY = os.getenv("DEEPGRAM_API_KEY")
 # Initialize Groq client
 groq_client = Groq(api_key=GROQ_API_KEY)
 
-# In-memory storage (in production, use Redis or database)
-sessions = {}
+# Persistent storage: sessions and an append-only chat log in SQLite (WAL mode).
+# Only the rows a request needs are read, so nothing is held in RAM between requests.
+CHAT_DB_PATH = os.getenv("CHAT_DB_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "chat_history.db"))
+HISTORY_PAGE_SIZE = 50
+HISTORY_MAX_PAGE_SIZE = 200
+CHAT_CONTEXT_MESSAGES = 10
+
+_db_local = threading.local()
+
+
+def get_db():
+    """Return this thread's SQLite connection, opening it on first use"""
+    conn = getattr(_db_local, 'conn', None)
+    if conn is None:
+        conn = sqlite3.connect(CHAT_DB_PATH, timeout=10)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        _db_local.conn = conn
+    return conn
+
+
+def init_db():
+    """Create the session and chat log tables if they don't exist"""
+    conn = get_db()
+    with conn:
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS sessions (
+                session_id TEXT PRIMARY KEY,
+                language TEXT NOT NULL DEFAULT 'en',
+                weather_data TEXT,
+                cleared_after INTEGER NOT NULL DEFAULT 0,
+                version INTEGER NOT NULL DEFAULT 0,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS chat_messages (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                session_id TEXT NOT NULL,
+                role TEXT NOT NULL,
+                content TEXT NOT NULL,
+                created_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_chat_messages_session
+                ON chat_messages (session_id, id);
+        """)
+
+
+def save_session(session_id: str, language: str = "en", weather_data=None):
+    """Create a session, or reset an existing one to start a fresh conversation.
+
+    Earlier messages stay in the log; they are hidden by moving the
+    ``cleared_after`` watermark past them.
+    """
+    now = time.time()
+    conn = get_db()
+    with conn:
+        conn.execute(
+            """
+            INSERT INTO sessions (session_id, language, weather_data, cleared_after, version, created_at, updated_at)
+            VALUES (?, ?, ?, (SELECT COALESCE(MAX(id), 0) FROM chat_messages WHERE session_id = ?), 0, ?, ?)
+            ON CONFLICT(session_id) DO UPDATE SET
+                language = excluded.language,
+                weather_data = excluded.weather_data,
+                cleared_after = excluded.cleared_after,
+                version = sessions.version + 1,
+                updated_at = excluded.updated_at
+            """,
+            (session_id, language, json.dumps(weather_data) if weather_data else None, session_id, now, now)
+        )
+
+
+def ensure_session(session_id: str, language: str = "en"):
+    """Create a session if it doesn't exist, leaving an existing one untouched"""
+    now = time.time()
+    conn = get_db()
+    with conn:
+        conn.execute(
+            """
+            INSERT INTO sessions (session_id, language, cleared_after, version, created_at, updated_at)
+            VALUES (?, ?, 0, 0, ?, ?)
+            ON CONFLICT(session_id) DO NOTHING
+            """,
+            (session_id, language, now, now)
+        )
+
+
+def get_session_record(session_id: str):
+    """Load session metadata (not the chat log), or None if it doesn't exist"""
+    row = get_db().execute(
+        "SELECT * FROM sessions WHERE session_id = ?", (session_id,)
+    ).fetchone()
+    if row is None:
+        return None
+    record = dict(row)
+    record['weather_data'] = json.loads(record['weather_data']) if record['weather_data'] else None
+    return record
+
+
+def update_session_weather(session_id: str, weather_data):
+    """Store the latest weather fetched for a session"""
+    conn = get_db()
+    with conn:
+        conn.execute(
+            "UPDATE sessions SET weather_data = ?, version = version + 1, updated_at = ? WHERE session_id = ?",
+            (json.dumps(weather_data) if weather_data else None, time.time(), session_id)
+        )
+
+
+def append_chat_messages(session_id: str, messages: List[dict]):
+    """Append messages to a session's chat log and return them with their ids"""
+    now = time.time()
+    conn = get_db()
+    appended = []
+    with conn:
+        for msg in messages:
+            cursor = conn.execute(
+                "INSERT INTO chat_messages (session_id, role, content, created_at) VALUES (?, ?, ?, ?)",
+                (session_id, msg['role'], msg['content'], now)
+            )
+            appended.append({'id': cursor.lastrowid, 'role': msg['role'], 'content': msg['content']})
+        conn.execute(
+            "UPDATE sessions SET version = version + 1, updated_at = ? WHERE session_id = ?",
+            (now, session_id)
+        )
+    return appended
+
+
+def get_chat_messages(session: dict, after: int = 0, limit: Optional[int] = None):
+    """Return visible messages with id greater than ``after``, oldest first"""
+    query = "SELECT id, role, content FROM chat_messages WHERE session_id = ? AND id > ? ORDER BY id"
+    params = [session['session_id'], max(after, session['cleared_after'])]
+    if limit is not None:
+        query += " LIMIT ?"
+        params.append(limit)
+    return [dict(row) for row in get_db().execute(query, params)]
+
+
+def get_recent_chat_messages(session: dict, count: int = CHAT_CONTEXT_MESSAGES):
+    """Return the last ``count`` visible messages, oldest first"""
+    rows = get_db().execute(
+        "SELECT id, role, content FROM chat_messages WHERE session_id = ? AND id > ? ORDER BY id DESC LIMIT ?",
+        (session['session_id'], session['cleared_after'], count)
+    ).fetchall()
+    return [dict(row) for row in reversed(rows)]
+
+
+def count_chat_messages(session: dict) -> int:
+    """Count the visible messages in a session's chat log"""
+    return get_db().execute(
+        "SELECT COUNT(*) FROM chat_messages WHERE session_id = ? AND id > ?",
+        (session['session_id'], session['cleared_after'])
+    ).fetchone()[0]
+
+
+def clear_chat_messages(session_id: str):
+    """Hide all current messages of a session without deleting them from the log"""
+    conn = get_db()
+    with conn:
+        conn.execute(
+            """
+            UPDATE sessions SET
+                cleared_after = (SELECT COALESCE(MAX(id), 0) FROM chat_messages WHERE session_id = ?),
+                version = version + 1,
+                updated_at = ?
+            WHERE session_id = ?
+            """,
+            (session_id, time.time(), session_id)
+        )
+
+
+def session_etag(session: dict) -> str:
+    """Build an ETag that changes whenever the session or its chat log changes.
+
+    The tag is weak because the same version is served in different
+    content codings (identity, gzip, br).
+    """
+    return f'W/"{session["session_id"]}-{session["version"]}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Check an If-None-Match header value against an ETag (weak comparison)"""
+    if not if_none_match:
+        return False
+    candidates = [tag.strip().removeprefix('W/') for tag in if_none_match.split(',')]
+    return '*' in candidates or etag.removeprefix('W/') in candidates
+
+
+init_db()
 
 
 # Request/Response models
@@ -46,6 +253,7 @@ class ChatRequest(BaseModel):
     session_id: str
     query: str
     language: str = "en"
+    lean: bool = False
 
 
 class TranscriptionRequest(BaseModel):
@@ -107,7 +315,7 @@ def fetch_weather(location: str):
         raise HTTPException(status_code=400, detail=f"Error fetching weather: {str(e)}")
 
 
-def format_weather_data(weather_data):
+def format_weather_data(weather_data, include_raw: bool = True):
     """Format weather data for display"""
     if not weather_data:
         return None
@@ -126,9 +334,10 @@ def format_weather_data(weather_data):
         'precipitation': f"{current['precip_mm']} mm",
         'uv_index': current['uv'],
         'visibility': f"{current['vis_km']} km",
-        'local_time': location['localtime'],
-        'raw_data': weather_data  # Include raw data for AI context
+        'local_time': location['localtime']
     }
+    if include_raw:
+        formatted['raw_data'] = weather_data  # Include raw data for AI context
     return formatted
 
 
@@ -485,10 +694,10 @@ def get_translations(language: str):
 
 
 @app.post("/api/weather")
-def get_weather(request: WeatherRequest):
+def get_weather(request: WeatherRequest, lean: bool = False):
     """Fetch weather data for a location"""
     weather_data = fetch_weather(request.location)
-    formatted = format_weather_data(weather_data)
+    formatted = format_weather_data(weather_data, include_raw=not lean)
     return formatted
 
 
@@ -498,18 +707,14 @@ def get_suggestions(request: ChatRequest):
     session_id = request.session_id
 
     # Get or create session
-    if session_id not in sessions:
+    session = get_session_record(session_id)
+    if session is None:
         # Create a new session if it doesn't exist (allow chatting without weather initially)
-        import uuid
-        sessions[session_id] = {
-            'weather_data': None,
-            'chat_history': [],
-            'language': request.language
-        }
+        ensure_session(session_id, request.language)
+        session = get_session_record(session_id)
 
-    session = sessions[session_id]
     weather_data = session.get('weather_data')
-    chat_history = session.get('chat_history', [])
+    chat_history = get_recent_chat_messages(session)
 
     # Get AI response with chat history context
     result = get_ai_suggestions(
@@ -522,56 +727,46 @@ def get_suggestions(request: ChatRequest):
 
     # Update session with new weather data if agent fetched it
     if result.get('weather_data') and result['weather_data'] != weather_data:
-        session['weather_data'] = result['weather_data']
-        # Format the new weather for display
-        session['formatted_weather'] = format_weather_data(result['weather_data'])
+        update_session_weather(session_id, result['weather_data'])
 
     suggestion = result['content']
 
     # Add to chat history
+    new_messages = []
     if request.query:
-        if 'chat_history' not in session:
-            session['chat_history'] = []
-        session['chat_history'].append({
-            'role': 'user',
-            'content': request.query
-        })
-        session['chat_history'].append({
-            'role': 'assistant',
-            'content': suggestion
-        })
-
-    # Return updated weather if it was fetched
-    response = {
-        "suggestion": suggestion,
-        "chat_history": session.get('chat_history', [])
-    }
+        new_messages = append_chat_messages(session_id, [
+            {'role': 'user', 'content': request.query},
+            {'role': 'assistant', 'content': suggestion}
+        ])
+
+    # Lean responses only carry the messages added by this turn
+    response = {"suggestion": suggestion}
+    if request.lean:
+        response['new_messages'] = new_messages
+    else:
+        response['chat_history'] = get_chat_messages(session)
 
     # Include updated weather if it changed
     if result.get('weather_data') and result['weather_data'] != weather_data:
-        response['weather'] = format_weather_data(result['weather_data'])
+        response['weather'] = format_weather_data(result['weather_data'], include_raw=not request.lean)
         response['weather_updated'] = True
 
     return response
 
 
 @app.post("/api/weather-with-suggestions")
-def get_weather_with_suggestions(request: WeatherRequest, language: str = "en", session_id: Optional[str] = None):
+def get_weather_with_suggestions(request: WeatherRequest, language: str = "en", session_id: Optional[str] = None, lean: bool = False):
     """Fetch weather and get initial AI suggestions"""
     import uuid
 
     weather_data = fetch_weather(request.location)
-    formatted = format_weather_data(weather_data)
+    formatted = format_weather_data(weather_data, include_raw=not lean)
 
     # Create or update session
     if not session_id:
         session_id = str(uuid.uuid4())
 
-    sessions[session_id] = {
-        'weather_data': weather_data,
-        'chat_history': [],
-        'language': language
-    }
+    save_session(session_id, language, weather_data)
 
     # Get initial suggestion with chat history
     result = get_ai_suggestions(
@@ -596,11 +791,7 @@ def create_session(language: str = "en"):
     import uuid
 
     session_id = str(uuid.uuid4())
-    sessions[session_id] = {
-        'weather_data': None,
-        'chat_history': [],
-        'language': language
-    }
+    ensure_session(session_id, language)
 
     return {
         "session_id": session_id,
@@ -627,19 +818,65 @@ async def transcribe_audio(
 
 
 @app.get("/api/session/{session_id}")
-def get_session(session_id: str):
-    """Get session data"""
-    if session_id not in sessions:
+def get_session(session_id: str, response: Response, if_none_match: Optional[str] = Header(None)):
+    """Get session summary (use /history for the chat log)"""
+    session = get_session_record(session_id)
+    if session is None:
         raise HTTPException(status_code=404, detail="Session not found")
-    return sessions[session_id]
+
+    etag = session_etag(session)
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+
+    weather = format_weather_data(session['weather_data'], include_raw=False)
+
+    return {
+        "session_id": session_id,
+        "language": session['language'],
+        "weather": weather,
+        "message_count": count_chat_messages(session),
+        "updated_at": session['updated_at']
+    }
+
+
+@app.get("/api/session/{session_id}/history")
+def get_session_history(
+    session_id: str,
+    response: Response,
+    cursor: int = 0,
+    limit: int = HISTORY_PAGE_SIZE,
+    if_none_match: Optional[str] = Header(None)
+):
+    """Get a page of chat history, oldest first, starting after ``cursor``"""
+    session = get_session_record(session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Session not found")
+
+    etag = session_etag(session)
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+
+    limit = max(1, min(limit, HISTORY_MAX_PAGE_SIZE))
+    # Fetch one extra row to know whether another page follows
+    messages = get_chat_messages(session, after=cursor, limit=limit + 1)
+    has_more = len(messages) > limit
+    messages = messages[:limit]
+
+    return {
+        "messages": messages,
+        "next_cursor": messages[-1]['id'] if has_more else None,
+        "has_more": has_more
+    }
 
 
 @app.delete("/api/session/{session_id}/chat")
 def clear_chat(session_id: str):
     """Clear chat history for a session"""
-    if session_id not in sessions:
+    if get_session_record(session_id) is None:
         raise HTTPException(status_code=404, detail="Session not found")
-    sessions[session_id]['chat_history'] = []
+    clear_chat_messages(session_id)
     return {"message": "Chat history cleared"}
 
 
@@ -102,7 +102,8 @@ function App() {
       const response = await axios.post(`${API_BASE_URL}/api/suggestions`, {
         session_id: sessionId,
         query,
-        language
+        language,
+        lean: true
       })
 
       // Update weather if agent automatically fetched it for a different location